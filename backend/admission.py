@@ -0,0 +1,352 @@
+# admission.py
+#
+# Admission control and load shedding for expensive routes.
+#
+# Each AdmissionPolicy caps concurrent requests on a route (per worker
+# process) and can add a per-client token-bucket rate limit. Requests
+# over the rate limit get 429 right away. Requests that cannot start
+# within the queue-time budget, or that find the wait queue full, get
+# 503. Either way they fail fast instead of piling up in the shared
+# threadpool and slowing down cheap routes like /health.
+#
+# Token buckets live in a RateLimitStore. MemoryRateLimitStore is exact
+# but per-process. MongoRateLimitStore shares an approximate limit across
+# all workers and nodes.
+#
+# Buckets are keyed by client IP. X-Forwarded-For is only honoured when
+# the socket peer is a trusted proxy (default loopback, where the Next.js
+# server normally runs; main.py reads TRUSTED_PROXIES from the env);
+# otherwise any client could pick a fresh bucket per request by sending
+# its own header.
+#
+# The rate limit fails open: if the store raises (e.g. Mongo is
+# unreachable) the request is admitted without a rate check, the error
+# is logged and counted under "storeerrors" in metrics(). Concurrency
+# caps still apply, so an outage of the limiter degrades to per-worker
+# load shedding instead of turning every request into a 500.
+
+import asyncio
+import ipaddress
+import json
+import logging
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Pattern, Sequence, Tuple, Union
+
+from pymongo import ReturnDocument
+from pymongo.collection import Collection
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+# -------------------------
+# Rate limit stores
+# -------------------------
+
+
+class RateLimitStore(ABC):
+    """Interface: take one token for `key`, returning False if empty."""
+
+    # Stores that do network I/O are called from the threadpool
+    blocking = False
+
+    @abstractmethod
+    def take(self, key: str, *, rate: float, burst: int) -> bool:
+        """Consume a token and return True, or return False if none is left."""
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """In-process token buckets (exact, but per worker)."""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, *, rate: float, burst: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Evict least recently used keys; an evicted client has been
+            # idle longest, so its bucket would have refilled anyway
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed
+
+
+class MongoRateLimitStore(RateLimitStore):
+    """
+    Shared limiter backed by a Mongo collection.
+
+    Approximates a token bucket with fixed windows of `burst / rate`
+    seconds allowing `burst` requests each. Window documents expire via a
+    TTL index. Mongo errors propagate; AdmissionController.take fails open.
+    """
+
+    blocking = True
+
+    def __init__(self, collection: Collection):
+        self.col = collection
+        self.col.create_index("expiresat", expireAfterSeconds=0)
+
+    def take(self, key: str, *, rate: float, burst: int) -> bool:
+        window = max(1.0, burst / rate)
+        slot = int(time.time() // window)
+        expires = datetime.now(timezone.utc) + timedelta(seconds=window * 2)
+        doc = self.col.find_one_and_update(
+            {"_id": f"{key}:{slot}"},
+            {"$inc": {"n": 1}, "$setOnInsert": {"expiresat": expires}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return doc["n"] <= burst
+
+
+# -------------------------
+# Policies
+# -------------------------
+
+
+@dataclass
+class AdmissionPolicy:
+    name: str
+    method: str
+    path: Pattern
+    max_concurrent: int
+    max_queue: int = 16
+    queue_timeout: float = 1.0
+    rate: Optional[float] = None  # tokens per second per client
+    burst: int = 10
+
+    _sem: Optional[asyncio.Semaphore] = field(default=None, repr=False)
+    waiting: int = 0
+    inflight: int = 0
+    admitted: int = 0
+    shed_rate: int = 0
+    shed_queue_full: int = 0
+    shed_queue_timeout: int = 0
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.path.fullmatch(path) is not None
+
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrent)
+        return self._sem
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "maxconcurrent": self.max_concurrent,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "shed": {
+                "ratelimited": self.shed_rate,
+                "queuefull": self.shed_queue_full,
+                "queuetimeout": self.shed_queue_timeout,
+            },
+        }
+
+
+DEFAULT_POLICIES: List[AdmissionPolicy] = [
+    AdmissionPolicy(
+        "conversations",
+        "GET",
+        re.compile(r"/messages/conversations/[^/]+"),
+        max_concurrent=8,
+        queue_timeout=0.5,
+        rate=2.0,
+        burst=10,
+    ),
+    AdmissionPolicy(
+        "messages",
+        "GET",
+        re.compile(r"/messages"),
+        max_concurrent=16,
+        queue_timeout=0.5,
+        rate=5.0,
+        burst=20,
+    ),
+    AdmissionPolicy(
+        "upload",
+        "POST",
+        re.compile(r"/upload"),
+        max_concurrent=4,
+        max_queue=8,
+        queue_timeout=2.0,
+        rate=0.2,
+        burst=5,
+    ),
+    AdmissionPolicy(
+        "export",
+        "GET",
+        re.compile(r"/admin/export"),
+        max_concurrent=1,
+        max_queue=0,
+    ),
+]
+
+
+# -------------------------
+# Middleware
+# -------------------------
+
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_trusted_proxies(value: str) -> List[Network]:
+    """Parse a comma-separated list of IPs / CIDRs."""
+    return [
+        ipaddress.ip_network(part.strip(), strict=False)
+        for part in value.split(",")
+        if part.strip()
+    ]
+
+
+DEFAULT_TRUSTED_PROXIES = parse_trusted_proxies("127.0.0.1,::1")
+
+
+def _is_trusted(addr: str, trusted: Sequence[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in net for net in trusted)
+
+
+def _client_key(scope: Dict[str, Any], trusted: Sequence[Network] = ()) -> str:
+    """
+    Client IP for rate limiting. The forwarding chain is walked from the
+    right (the hop our proxy appended) and the first untrusted address
+    wins; entries further left are client-supplied and ignored.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not _is_trusted(peer, trusted):
+        return peer
+    hops: List[str] = []
+    for name, value in scope.get("headers") or []:
+        if name == b"x-forwarded-for":
+            hops.extend(h.strip() for h in value.decode("latin-1").split(","))
+    for hop in reversed(hops):
+        if hop and not _is_trusted(hop, trusted):
+            return hop
+    return peer
+
+
+async def _reject(send, status: int, detail: str, retry_after: int) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionController:
+    """Policies, the rate limit store and the metrics they produce."""
+
+    def __init__(
+        self,
+        policies: List[AdmissionPolicy],
+        store: Optional[RateLimitStore] = None,
+        *,
+        trusted_proxies: Sequence[Network] = DEFAULT_TRUSTED_PROXIES,
+    ):
+        self.policies = policies
+        self.trusted_proxies = list(trusted_proxies)
+        self.store_errors = 0
+        # May be swapped for a shared store once one is available
+        self.store: RateLimitStore = store or MemoryRateLimitStore()
+
+    def match(self, method: str, path: str) -> Optional[AdmissionPolicy]:
+        for p in self.policies:
+            if p.matches(method, path):
+                return p
+        return None
+
+    def client_key(self, scope: Dict[str, Any]) -> str:
+        return _client_key(scope, self.trusted_proxies)
+
+    async def take(self, key: str, policy: AdmissionPolicy) -> bool:
+        """Take a token for `key`; admits the request if the store fails."""
+        store = self.store
+        try:
+            if store.blocking:
+                return await run_in_threadpool(
+                    store.take, key, rate=policy.rate, burst=policy.burst
+                )
+            return store.take(key, rate=policy.rate, burst=policy.burst)
+        except Exception:
+            self.store_errors += 1
+            logger.warning("Rate limit store failed; admitting", exc_info=True)
+            return True
+
+    def metrics(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {p.name: p.metrics() for p in self.policies}
+        out["storeerrors"] = self.store_errors
+        return out
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying the first matching AdmissionPolicy."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        policy = self.controller.match(scope["method"], scope["path"])
+        if policy is None:
+            return await self.app(scope, receive, send)
+
+        if policy.rate is not None:
+            key = f"{policy.name}:{self.controller.client_key(scope)}"
+            if not await self.controller.take(key, policy):
+                policy.shed_rate += 1
+                return await _reject(send, 429, "Too many requests", 1)
+
+        sem = policy.semaphore()
+        if sem.locked() and policy.waiting >= policy.max_queue:
+            policy.shed_queue_full += 1
+            return await _reject(send, 503, "Server busy, try again", 1)
+
+        policy.waiting += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), policy.queue_timeout)
+        except asyncio.TimeoutError:
+            policy.shed_queue_timeout += 1
+            return await _reject(send, 503, "Server busy, try again", 1)
+        finally:
+            policy.waiting -= 1
+
+        policy.admitted += 1
+        policy.inflight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            policy.inflight -= 1
+            sem.release()
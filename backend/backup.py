@@ -0,0 +1,261 @@
+"""Streaming NDJSON export / import for accounts, listings and messages.
+
+Each line is one document tagged with its collection:
+
+  {"collection": "listings", "doc": {"_id": "...", "title": "...", ...}}
+
+Export reads with batched cursors and yields lines through a generator,
+optionally gzip-compressed, so memory use does not depend on dataset
+size. Import reads lines lazily, inserts them in chunks with insert_many
+and records a checkpoint (the last committed line number) after each
+chunk so an interrupted import can be resumed.
+
+Usage:
+  python backup.py export backup.ndjson.gz
+  python backup.py import backup.ndjson.gz --checkpoint backup.ckpt
+"""
+
+import argparse
+import gzip
+import json
+import zlib
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from schema import ACCOUNT_SCHEMA, LISTING_SCHEMA, MESSAGE_SCHEMA, Schema
+
+COLLECTIONS = ("accounts", "listings", "listings_archive", "messages")
+BATCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+_DUPLICATE_KEY = 11000
+
+SCHEMAS: Dict[str, Schema] = {
+    "accounts": ACCOUNT_SCHEMA,
+    "listings": LISTING_SCHEMA,
+    "listings_archive": LISTING_SCHEMA,
+    "messages": MESSAGE_SCHEMA,
+}
+
+
+def _collection(db: Any, name: str):
+    if name not in COLLECTIONS:
+        raise ValueError(f"collection must be one of {', '.join(COLLECTIONS)}")
+    return getattr(db, name)
+
+
+# -------------------------
+# Export
+# -------------------------
+
+
+def iter_export_lines(
+    db: Any,
+    collections: Iterable[str] = COLLECTIONS,
+    *,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Yield one encoded NDJSON line per document, collection by collection."""
+    for name in collections:
+        cur = _collection(db, name).find({}).sort("_id", 1).batch_size(batch_size)
+        for doc in cur:
+            line = json.dumps({"collection": name, "doc": doc}, default=str)
+            yield line.encode("utf-8") + b"\n"
+
+
+def iter_chunks(
+    lines: Iterable[bytes], *, chunk_bytes: int = CHUNK_BYTES
+) -> Iterator[bytes]:
+    """Group small lines into larger writes."""
+    buf: List[bytes] = []
+    size = 0
+    for line in lines:
+        buf.append(line)
+        size += len(line)
+        if size >= chunk_bytes:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield b"".join(buf)
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip-compress a byte stream incrementally."""
+    comp = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        out = comp.compress(chunk)
+        if out:
+            yield out
+    yield comp.flush()
+
+
+def iter_export(
+    db: Any,
+    collections: Iterable[str] = COLLECTIONS,
+    *,
+    compress: bool = False,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Full export pipeline: cursor -> lines -> chunks -> (gzip)."""
+    stream = iter_chunks(iter_export_lines(db, collections, batch_size=batch_size))
+    return iter_gzip(stream) if compress else stream
+
+
+def export_ndjson(
+    db: Any,
+    path: Path,
+    collections: Iterable[str] = COLLECTIONS,
+    *,
+    batch_size: int = BATCH_SIZE,
+) -> None:
+    """Write an export to `path`; a `.gz` suffix enables compression."""
+    compress = path.suffix == ".gz"
+    with open(path, "wb") as f:
+        for chunk in iter_export(
+            db, collections, compress=compress, batch_size=batch_size
+        ):
+            f.write(chunk)
+
+
+# -------------------------
+# Import
+# -------------------------
+
+
+def _open_lines(path: Path) -> IO[bytes]:
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _read_checkpoint(path: Optional[Path]) -> int:
+    if path is None or not path.exists():
+        return 0
+    return int(path.read_text().strip() or 0)
+
+
+def _write_checkpoint(path: Optional[Path], line_no: int) -> None:
+    if path is None:
+        return
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(str(line_no))
+    tmp.replace(path)
+
+
+def _insert_chunk(db: Any, name: str, docs: List[Dict[str, Any]]) -> int:
+    """insert_many that tolerates documents already present (for resumes)."""
+    try:
+        res = _collection(db, name).insert_many(docs, ordered=False)
+        return len(res.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != _DUPLICATE_KEY for err in errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+def iter_import_records(
+    lines: Iterable[bytes], *, skip: int = 0
+) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+    """Yield (line_no, collection, doc), skipping the first `skip` lines."""
+    for line_no, raw in enumerate(lines, start=1):
+        if line_no <= skip or not raw.strip():
+            continue
+        rec = json.loads(raw)
+        yield line_no, rec["collection"], rec["doc"]
+
+
+def import_ndjson(
+    db: Any,
+    path: Path,
+    *,
+    checkpoint: Optional[Path] = None,
+    chunk_size: int = BATCH_SIZE,
+    validate: bool = True,
+) -> int:
+    """
+    Import an export file, resuming after the checkpointed line if any.
+
+    With `validate`, each document goes through the same schema
+    as Database writes before it is queued for insert_many.
+    """
+    start = _read_checkpoint(checkpoint)
+    inserted = 0
+    pending: List[Dict[str, Any]] = []
+    pending_col: Optional[str] = None
+    last_line = start
+
+    def flush() -> None:
+        nonlocal inserted, pending
+        if pending:
+            inserted += _insert_chunk(db, pending_col, pending)
+            pending = []
+        _write_checkpoint(checkpoint, last_line)
+
+    with _open_lines(path) as f:
+        for line_no, name, doc in iter_import_records(f, skip=start):
+            if pending and (name != pending_col or len(pending) >= chunk_size):
+                flush()
+            pending_col = name
+            if validate and name in SCHEMAS:
+                try:
+                    doc = {**doc, **SCHEMAS[name].validate(doc)}
+                except ValueError as e:
+                    raise ValueError(f"line {line_no} ({name}): {e}") from e
+            pending.append(doc)
+            last_line = line_no
+        flush()
+
+    return inserted
+
+
+# -------------------------
+# CLI
+# -------------------------
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    exp = sub.add_parser("export", help="export collections to NDJSON")
+    exp.add_argument("path", type=Path)
+    exp.add_argument("--collections", nargs="+", default=list(COLLECTIONS))
+    exp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    imp = sub.add_parser("import", help="import an NDJSON export")
+    imp.add_argument("path", type=Path)
+    imp.add_argument("--checkpoint", type=Path, default=None)
+    imp.add_argument("--chunk-size", type=int, default=BATCH_SIZE)
+    imp.add_argument("--no-validate", dest="validate", action="store_false")
+
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+
+    from database import get_db_from_env
+
+    database = get_db_from_env()
+
+    if args.cmd == "export":
+        export_ndjson(
+            database, args.path, args.collections, batch_size=args.batch_size
+        )
+        print(f"Exported {', '.join(args.collections)} → {args.path}")
+    else:
+        n = import_ndjson(
+            database,
+            args.path,
+            checkpoint=args.checkpoint,
+            chunk_size=args.chunk_size,
+            validate=args.validate,
+        )
+        # Imported listings bypass the incremental counters
+        database.reconcile_listing_stats()
+        print(f"Imported {n} documents from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Microbenchmark: per-document listing validation cost for bulk imports.
+
+Compares the previous hand-written validator (inlined below as the
+baseline) with LISTING_SCHEMA from schema.py.
+
+Usage:
+  python bench_validation.py [N]
+"""
+
+import sys
+import timeit
+from typing import Any, Dict
+
+from schema import LISTING_SCHEMA
+
+
+def _legacy_listing_type(t: str) -> str:
+    t = (t or "").strip().lower()
+    if t in ("request", "req", "requests"):
+        return "request"
+    if t in ("item", "items", "listing", "listings"):
+        return "item"
+    raise ValueError("type must be 'request(s)' or 'item'")
+
+
+def _legacy_nonempty_str(value: Any, field: str, *, max_len: int = 200) -> str:
+    s = str(value or "").strip()
+    if not s:
+        raise ValueError(f"{field} is required")
+    if len(s) > max_len:
+        raise ValueError(f"{field} must be <= {max_len} characters")
+    return s
+
+
+def legacy_validate_listing(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Validation as done before schema.py (create path)."""
+    t = _legacy_listing_type(doc.get("type"))
+    title = _legacy_nonempty_str(doc.get("title"), "title", max_len=140)
+    try:
+        price = int(float(doc.get("price") or 0))
+    except (TypeError, ValueError):
+        raise ValueError("price must be a number")
+    if price < 0:
+        raise ValueError("price must be >= 0")
+    imagekey = str(doc.get("imagekey") or "").strip()
+    user = _legacy_nonempty_str(doc.get("user"), "user", max_len=80)
+    return {
+        "type": t,
+        "title": title,
+        "price": price,
+        "imagekey": imagekey,
+        "user": user,
+    }
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    docs = [
+        {
+            "type": "item" if i % 3 else "request",
+            "title": f"Listing number {i}",
+            "price": i % 500,
+            "imagekey": "ChairPlaceholder.jpg" if i % 2 else "",
+            "user": f"user{i % 97}",
+        }
+        for i in range(n)
+    ]
+    for d in docs[:100]:
+        assert legacy_validate_listing(d) == LISTING_SCHEMA.validate(d)
+
+    candidates = {
+        "legacy": legacy_validate_listing,
+        "schema": LISTING_SCHEMA.validate,
+    }
+    best = dict.fromkeys(candidates, float("inf"))
+    # Interleave rounds so machine noise affects both sides equally
+    for _ in range(7):
+        for label, fn in candidates.items():
+            t = timeit.timeit(lambda: [fn(d) for d in docs], number=1)
+            best[label] = min(best[label], t)
+    for label, t in best.items():
+        print(f"{label:>8}: {t / n * 1e9:8.0f} ns/doc  ({n} docs)")
+
+
+if __name__ == "__main__":
+    main()
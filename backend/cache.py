@@ -0,0 +1,60 @@
+# cache.py
+#
+# Small in-process caches shared by Database and the API layer.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+# Sentinel for "no entry", distinct from a cached None
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe bounded LRU cache with per-entry expiry.
+
+    `get` returns `default` on a miss, so callers that cache `None`
+    (negative caching) should pass a sentinel as `default`.
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                return default
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, *, ttl: Optional[float] = None) -> None:
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -10,18 +10,56 @@
 import os
 import re
 from dataclasses import dataclass
-from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
-from pymongo import MongoClient, DESCENDING, ASCENDING
+from pymongo import MongoClient, DESCENDING, ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
 from bson import ObjectId
 
+from cache import MISSING, TTLCache
+from outbox import ensure_outbox_indexes
+from schema import (
+    ACCOUNT_SCHEMA,
+    LISTING_SCHEMA,
+    MESSAGE_SCHEMA,
+    SAVED_SEARCH_SCHEMA,
+    normalize_listing_type as _normalize_listing_type,
+)
+from stats import ListingStats
+
 
 # -------------------------
 # Helpers
 # -------------------------
 
-EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+# Account cache tuning. Unknown usernames are cached for a shorter time so
+# a newly registered name on another node becomes visible quickly.
+#
+# The cache is per process and writes only invalidate the process that
+# made them, so other workers can serve an account up to ACCOUNT_CACHE_TTL
+# seconds stale. Fine for display fields, not for credentials: login uses
+# get_account_for_login(), which always reads password/isactive from Mongo.
+ACCOUNT_CACHE_SIZE = 10_000
+ACCOUNT_CACHE_TTL = 60.0
+ACCOUNT_NEGATIVE_TTL = 10.0
+
+T = TypeVar("T")
+
+# Active (unsold) listings. Every listing document has `soldat` set to
+# null or a string, so this matches exactly the same rows as
+# {"soldat": None} and, being identical to the partial index filter
+# below, lets the planner use the active-only indexes.
+ACTIVE_LISTING = {"soldat": {"$type": "null"}}
+
+# Sold listings older than this move to the archive collection
+ARCHIVE_AFTER_DAYS = 90
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "for", "in", "of", "the", "to",
+    "iso", "looking", "need",
+}
 
 
 def new_id() -> str:
@@ -34,22 +72,20 @@ def _utcnow_iso() -> str:
     return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
 
-def _normalize_listing_type(t: str) -> str:
-    t = (t or "").strip().lower()
-    if t in ("request", "req", "requests"):
-        return "request"
-    if t in ("item", "items", "listing", "listings"):
-        return "item"
-    raise ValueError("type must be 'request(s)' or 'item'")
-
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased keyword tokens used by saved searches.
 
-def _validate_nonempty_str(value: Any, field: str, *, max_len: int = 200) -> str:
-    s = str(value or "").strip()
-    if not s:
-        raise ValueError(f"{field} is required")
-    if len(s) > max_len:
-        raise ValueError(f"{field} must be <= {max_len} characters")
-    return s
+    Trailing plural "s" is dropped so "Locks" matches "lock".
+    """
+    out: List[str] = []
+    for tok in TOKEN_RE.findall(str(text or "").lower()):
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        if len(tok) < 2 or tok in STOPWORDS:
+            continue
+        out.append(tok)
+    return list(dict.fromkeys(out))
 
 
 # -------------------------
@@ -85,81 +121,41 @@ class MessageInput:
     isread: bool = False
 
 
+@dataclass
+class SavedSearchInput:
+    accountid: str
+    keywords: str
+    type: Optional[str] = None
+    maxprice: Optional[float] = None
+
+
 # -------------------------
 # Validation
 # -------------------------
 
 
-def validate_listing_input(li: ListingInput) -> Dict[str, Any]:
-    t = _normalize_listing_type(li.type)
-    title = _validate_nonempty_str(li.title, "title", max_len=140)
-
-    try:
-        price = int(float(li.price or 0))
-    except (TypeError, ValueError):
-        raise ValueError("price must be a number")
-    if price < 0:
-        raise ValueError("price must be >= 0")
+# Rules live in schema.py; these wrappers keep the input dataclasses as
+# the Database API.
 
-    # Schema requires imagekey as a string (use "" for no image)
-    imagekey = str(li.image_key or "").strip()
-    user = _validate_nonempty_str(li.user, "user", max_len=80)
 
-    return {
-        "type": t,
-        "title": title,
-        "price": price,
-        "imagekey": imagekey,
-        "user": user,
-    }
+def validate_listing_input(li: ListingInput) -> Dict[str, Any]:
+    return LISTING_SCHEMA.validate(li)
 
 
 def validate_account_input(ai: AccountInput) -> Dict[str, Any]:
-    username = _validate_nonempty_str(ai.username, "username", max_len=40)
-    password = _validate_nonempty_str(ai.password, "password", max_len=200)
-    if len(password) < 8:
-        raise ValueError("password must be at least 8 characters")
-
-    email = _validate_nonempty_str(ai.email, "email", max_len=254)
-    if not EMAIL_RE.match(email):
-        raise ValueError("email must be a valid email address")
-
-    if not isinstance(ai.isactive, bool):
-        raise ValueError("isactive must be a boolean")
-
-    role = str(ai.role or "").strip().lower()
-    if role not in ("user", "admin"):
-        raise ValueError("role must be 'user' or 'admin'")
-
-    return {
-        "username": username,
-        "password": password,
-        "email": email,
-        "isactive": ai.isactive,
-        "role": role,
-    }
+    return ACCOUNT_SCHEMA.validate(ai)
 
 
 def validate_message_input(mi: MessageInput) -> Dict[str, Any]:
-    senderid = _validate_nonempty_str(mi.senderid, "senderid", max_len=50)
-    recipientid = _validate_nonempty_str(mi.recipientid, "recipientid", max_len=50)
-    conversationid = _validate_nonempty_str(
-        mi.conversationid, "conversationid", max_len=50
-    )
-    listingid = _validate_nonempty_str(mi.listingid, "listingid", max_len=50)
-    message = _validate_nonempty_str(mi.message, "message", max_len=4000)
+    return MESSAGE_SCHEMA.validate(mi)
 
-    if not isinstance(mi.isread, bool):
-        raise ValueError("isread must be a boolean")
 
-    return {
-        "senderid": senderid,
-        "recipientid": recipientid,
-        "conversationid": conversationid,
-        "listingid": listingid,
-        "message": message,
-        "isread": mi.isread,
-    }
+def validate_saved_search_input(si: SavedSearchInput) -> Dict[str, Any]:
+    base = SAVED_SEARCH_SCHEMA.validate(si)
+    keywords = tokenize(base["query"])
+    if not keywords:
+        raise ValueError("keywords must contain at least one searchable word")
+    return {**base, "keywords": keywords}
 
 
 # -------------------------
@@ -169,10 +165,12 @@ def validate_message_input(mi: MessageInput) -> Dict[str, Any]:
 
 class Database:
     """
-    Interactor for three collections:
+    Interactor for the core collections:
       - accounts
-      - listings
+      - listings (hot: active + recently sold) / listings_archive (cold)
       - messages
+      - savedsearches / notifications
+      - outbox (events for post-write side effects, see outbox.py)
 
     All IDs and dates are stored as strings to comply with the
     MongoDB JSON Schema validation rules on the Atlas cluster.
@@ -185,14 +183,35 @@ class Database:
         *,
         accounts_col: str = "accounts",
         listings_col: str = "listings",
+        listings_archive_col: str = "listings_archive",
         messages_col: str = "messages",
+        stats_col: str = "listing_stats",
+        saved_searches_col: str = "savedsearches",
+        notifications_col: str = "notifications",
+        outbox_col: str = "outbox",
         client: Optional[MongoClient] = None,
+        account_cache: Optional[TTLCache] = None,
+        outbox_transactions: bool = True,
     ):
         self.client = client or MongoClient(uri)
+        # Transactions need a replica set (Atlas always is); a standalone
+        # dev server can disable them at the cost of write/event atomicity.
+        self.outbox_transactions = outbox_transactions
         db = self.client[db_name]
         self.accounts = db[accounts_col]
         self.listings = db[listings_col]
+        self.listings_archive = db[listings_archive_col]
         self.messages = db[messages_col]
+        self.stats = ListingStats(db[stats_col])
+        self.saved_searches = db[saved_searches_col]
+        self.notifications = db[notifications_col]
+        self.outbox = db[outbox_col]
+
+        # Keys are ("id", _id) and ("username", username); values are public
+        # account dicts, or None for a username known not to exist.
+        self.account_cache = account_cache or TTLCache(
+            ACCOUNT_CACHE_SIZE, ACCOUNT_CACHE_TTL
+        )
 
         # Indexes (safe to call repeatedly)
         self.accounts.create_index([("username", ASCENDING)], unique=True)
@@ -203,6 +222,31 @@ class Database:
         self.listings.create_index([("user", ASCENDING), ("createdat", DESCENDING)])
         self.listings.create_index([("type", ASCENDING), ("createdat", DESCENDING)])
 
+        # Active-only partial indexes for browse/featured queries, so sold
+        # rows are never scanned and the index stays small. The trailing
+        # _id keeps key patterns distinct from the full indexes above.
+        for keys in (
+            [("createdat", DESCENDING)],
+            [("type", ASCENDING), ("createdat", DESCENDING)],
+            [("user", ASCENDING), ("createdat", DESCENDING)],
+        ):
+            self.listings.create_index(
+                keys + [("_id", DESCENDING)],
+                name="active_" + "_".join(k for k, _ in keys),
+                partialFilterExpression=ACTIVE_LISTING,
+            )
+        # Only sold rows, for the archival job
+        self.listings.create_index(
+            [("soldat", ASCENDING)],
+            name="sold_soldat",
+            partialFilterExpression={"soldat": {"$type": "string"}},
+        )
+
+        self.listings_archive.create_index(
+            [("user", ASCENDING), ("createdat", DESCENDING)]
+        )
+        self.listings_archive.create_index([("soldat", DESCENDING)])
+
         self.messages.create_index(
             [("conversationid", ASCENDING), ("timestamp", ASCENDING)]
         )
@@ -217,6 +261,53 @@ class Database:
             ]
         )
 
+        # Multikey index on keywords is the inverted index used to match
+        # new listings against saved searches.
+        self.saved_searches.create_index([("keywords", ASCENDING)])
+        self.saved_searches.create_index(
+            [("accountid", ASCENDING), ("createdat", DESCENDING)]
+        )
+        self.notifications.create_index(
+            [
+                ("accountid", ASCENDING),
+                ("isread", ASCENDING),
+                ("createdat", DESCENDING),
+            ]
+        )
+
+        ensure_outbox_indexes(self.outbox)
+
+    def close(self) -> None:
+        self.client.close()
+
+    # ---------
+    # Outbox
+    # ---------
+
+    def _atomic(self, fn: Callable[[Any], T]) -> T:
+        """Run `fn(session)` in a transaction (or directly if disabled)."""
+        if not self.outbox_transactions:
+            return fn(None)
+        with self.client.start_session() as session:
+            return session.with_transaction(fn)
+
+    def _emit(self, topic: str, payload: Dict[str, Any], session: Any) -> None:
+        now = _utcnow_iso()
+        self.outbox.insert_one(
+            {
+                "_id": new_id(),
+                "topic": topic,
+                "payload": payload,
+                "createdat": now,
+                "availableat": now,
+                "status": "pending",
+                "attempts": 0,
+                "lockedby": None,
+                "lockeduntil": None,
+            },
+            session=session,
+        )
+
     # ---------
     # Listings
     # ---------
@@ -229,13 +320,49 @@ class Database:
             "createdat": _utcnow_iso(),
             "soldat": None,
         }
-        self.listings.insert_one(doc)
+
+        def write(session: Any) -> None:
+            self.listings.insert_one(doc, session=session)
+            self._emit("listing.created", doc, session)
+
+        self._atomic(write)
+        self.stats.apply(None, doc)
         return doc["_id"]
 
     def get_listing(self, listing_id: str) -> Optional[Dict[str, Any]]:
         doc = self.listings.find_one({"_id": listing_id})
+        if doc is None:
+            doc = self.listings_archive.find_one({"_id": listing_id})
         return self._public_listing(doc) if doc else None
 
+    def get_listings_by_ids(self, listing_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch many listings in one query, keyed by id (missing ids are omitted)."""
+        ids = list(dict.fromkeys(i for i in listing_ids if i))
+        if not ids:
+            return {}
+        cur = self.listings.find({"_id": {"$in": ids}})
+        found = {d["_id"]: self._public_listing(d) for d in cur}
+        misses = [i for i in ids if i not in found]
+        if misses:
+            cur = self.listings_archive.find({"_id": {"$in": misses}})
+            found.update((d["_id"], self._public_listing(d)) for d in cur)
+        return found
+
+    def iter_active_titles(
+        self, *, since: Optional[str] = None, batch_size: int = 1000
+    ) -> Iterator[Tuple[str, str]]:
+        """
+        Stream (id, title) for every unsold listing, or with `since` only
+        those created after that ISO timestamp.
+        """
+        q: Dict[str, Any] = dict(ACTIVE_LISTING)
+        if since:
+            q["createdat"] = {"$gt": since}
+        cur = self.listings.find(q, {"title": 1})
+        cur = cur.batch_size(batch_size)
+        for d in cur:
+            yield d["_id"], d.get("title") or ""
+
     def list_listings(
         self,
         *,
@@ -250,50 +377,107 @@ class Database:
         if user:
             q["user"] = str(user).strip()
         if not include_sold:
-            q["soldat"] = None
+            q.update(ACTIVE_LISTING)
 
         lim = max(1, min(int(limit), 200))
         cur = self.listings.find(q).sort("createdat", DESCENDING).limit(lim)
         return [self._public_listing(d) for d in cur]
 
     def update_listing(self, listing_id: str, updates: Dict[str, Any]) -> bool:
-        allowed = {"type", "title", "price", "imagekey", "user"}
-        safe: Dict[str, Any] = {}
-        for k, v in (updates or {}).items():
-            if k not in allowed:
-                continue
-            if k == "type":
-                safe["type"] = _normalize_listing_type(str(v))
-            elif k == "title":
-                safe["title"] = _validate_nonempty_str(v, "title", max_len=140)
-            elif k == "price":
-                try:
-                    price = int(float(v))
-                except (TypeError, ValueError):
-                    raise ValueError("price must be a number")
-                if price < 0:
-                    raise ValueError("price must be >= 0")
-                safe["price"] = price
-            elif k == "imagekey":
-                safe["imagekey"] = str(v or "").strip()
-            elif k == "user":
-                safe["user"] = _validate_nonempty_str(v, "user", max_len=80)
-
+        safe = LISTING_SCHEMA.validate_partial(updates)
         if not safe:
             return False
 
-        res = self.listings.update_one({"_id": listing_id}, {"$set": safe})
-        return res.matched_count == 1
+        def write(session: Any) -> Optional[Dict[str, Any]]:
+            before = self.listings.find_one_and_update(
+                {"_id": listing_id},
+                {"$set": safe},
+                return_document=ReturnDocument.BEFORE,
+                session=session,
+            )
+            if before is not None:
+                self._emit("listing.updated", {"_id": listing_id, **safe}, session)
+            return before
+
+        before = self._atomic(write)
+        if before is None:
+            return False
+        self.stats.apply(before, {**before, **safe})
+        return True
 
     def mark_listing_sold(self, listing_id: str) -> bool:
-        res = self.listings.update_one(
-            {"_id": listing_id}, {"$set": {"soldat": _utcnow_iso()}}
-        )
-        return res.matched_count == 1
+        soldat = _utcnow_iso()
+
+        def write(session: Any) -> Optional[Dict[str, Any]]:
+            before = self.listings.find_one_and_update(
+                {"_id": listing_id},
+                {"$set": {"soldat": soldat}},
+                return_document=ReturnDocument.BEFORE,
+                session=session,
+            )
+            if before is not None:
+                payload = {"_id": listing_id, "soldat": soldat}
+                self._emit("listing.sold", payload, session)
+            return before
+
+        before = self._atomic(write)
+        if before is None:
+            return False
+        self.stats.apply(before, {**before, "soldat": soldat})
+        return True
 
     def delete_listing(self, listing_id: str) -> bool:
-        res = self.listings.delete_one({"_id": listing_id})
-        return res.deleted_count == 1
+        def write(session: Any) -> Optional[Dict[str, Any]]:
+            q = {"_id": listing_id}
+            before = self.listings.find_one_and_delete(q, session=session)
+            if before is None:
+                before = self.listings_archive.find_one_and_delete(q, session=session)
+            if before is not None:
+                self._emit("listing.deleted", {"_id": listing_id}, session)
+            return before
+
+        before = self._atomic(write)
+        if before is None:
+            return False
+        self.stats.apply(before, None)
+        return True
+
+    def listing_stats(self, *, days: int = 7) -> Dict[str, Any]:
+        return self.stats.snapshot(days=days)
+
+    def reconcile_listing_stats(self) -> None:
+        self.stats.reconcile(
+            [self.listings, self.listings_archive], now_iso=_utcnow_iso()
+        )
+
+    def archive_sold_listings(
+        self, *, older_than_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = 500
+    ) -> int:
+        """
+        Move listings sold more than `older_than_days` ago into the archive.
+
+        Each batch is copied before it is deleted, and duplicate ids in the
+        archive are ignored, so an interrupted run is safe to repeat.
+        """
+        cutoff = (
+            (datetime.now(timezone.utc) - timedelta(days=older_than_days))
+            .isoformat()
+            .replace("+00:00", "Z")
+        )
+        q = {"soldat": {"$type": "string", "$lt": cutoff}}
+        moved = 0
+        while True:
+            batch = list(self.listings.find(q).limit(batch_size))
+            if not batch:
+                return moved
+            try:
+                self.listings_archive.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(err.get("code") != 11000 for err in errors):
+                    raise
+            ids = [d["_id"] for d in batch]
+            moved += self.listings.delete_many({"_id": {"$in": ids}}).deleted_count
 
     def _public_listing(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         return {
@@ -319,16 +503,66 @@ class Database:
             "createdat": _utcnow_iso(),
         }
         self.accounts.insert_one(doc)
+        self.account_cache.pop(("username", doc["username"]))
         return doc["_id"]
 
     def get_account(self, account_id: str) -> Optional[Dict[str, Any]]:
+        hit = self.account_cache.get(("id", account_id), MISSING)
+        if hit is not MISSING:
+            return dict(hit)
         doc = self.accounts.find_one({"_id": account_id})
-        return self._public_account(doc) if doc else None
+        if not doc:
+            return None
+        account = self._public_account(doc)
+        self._cache_account(account)
+        return dict(account)
+
+    def get_accounts_by_ids(self, account_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch many accounts in one query, keyed by id (missing ids are omitted)."""
+        ids = list(dict.fromkeys(i for i in account_ids if i))
+        if not ids:
+            return {}
+        found: Dict[str, Dict[str, Any]] = {}
+        misses: List[str] = []
+        for i in ids:
+            hit = self.account_cache.get(("id", i))
+            if hit is not None:
+                found[i] = dict(hit)
+            else:
+                misses.append(i)
+        if misses:
+            for d in self.accounts.find({"_id": {"$in": misses}}):
+                account = self._public_account(d)
+                self._cache_account(account)
+                found[d["_id"]] = dict(account)
+        return found
 
     def get_account_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        u = str(username or "").strip()
+        hit = self.account_cache.get(("username", u), MISSING)
+        if hit is not MISSING:
+            return dict(hit) if hit is not None else None
+        doc = self.accounts.find_one({"username": u})
+        if not doc:
+            self.account_cache.set(("username", u), None, ttl=ACCOUNT_NEGATIVE_TTL)
+            return None
+        account = self._public_account(doc)
+        self._cache_account(account)
+        return dict(account)
+
+    def get_account_for_login(self, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Uncached lookup for authentication, so a password change or
+        deactivation takes effect on every worker immediately. The fresh
+        document also refreshes this process's cache entry.
+        """
         u = str(username or "").strip()
         doc = self.accounts.find_one({"username": u})
-        return self._public_account(doc) if doc else None
+        if not doc:
+            return None
+        account = self._public_account(doc)
+        self._cache_account(account)
+        return dict(account)
 
     def list_accounts(self, *, limit: int = 50) -> List[Dict[str, Any]]:
         lim = max(1, min(int(limit), 200))
@@ -336,49 +570,71 @@ class Database:
         return [self._public_account(d) for d in cur]
 
     def update_account(self, account_id: str, updates: Dict[str, Any]) -> bool:
-        allowed = {"username", "password", "email", "isactive", "role"}
-        safe: Dict[str, Any] = {}
-
-        for k, v in (updates or {}).items():
-            if k not in allowed:
-                continue
-            if k == "username":
-                safe["username"] = _validate_nonempty_str(v, "username", max_len=40)
-            elif k == "password":
-                pw = _validate_nonempty_str(v, "password", max_len=200)
-                if len(pw) < 8:
-                    raise ValueError("password must be at least 8 characters")
-                safe["password"] = pw
-            elif k == "email":
-                email = _validate_nonempty_str(v, "email", max_len=254)
-                if not EMAIL_RE.match(email):
-                    raise ValueError("email must be a valid email address")
-                safe["email"] = email
-            elif k == "isactive":
-                if not isinstance(v, bool):
-                    raise ValueError("isactive must be a boolean")
-                safe["isactive"] = v
-            elif k == "role":
-                role = str(v or "").strip().lower()
-                if role not in ("user", "admin"):
-                    raise ValueError("role must be 'user' or 'admin'")
-                safe["role"] = role
-
+        safe = ACCOUNT_SCHEMA.validate_partial(updates)
         if not safe:
             return False
 
-        res = self.accounts.update_one({"_id": account_id}, {"$set": safe})
-        return res.matched_count == 1
+        before = self._atomic(
+            lambda session: self._update_account_and_emit(
+                account_id, {"$set": safe}, session
+            )
+        )
+        self._invalidate_account(account_id, before, safe.get("username"))
+        return before is not None
 
     def deactivate_account(self, account_id: str) -> bool:
-        res = self.accounts.update_one(
-            {"_id": account_id}, {"$set": {"isactive": False}}
+        before = self._atomic(
+            lambda session: self._update_account_and_emit(
+                account_id, {"$set": {"isactive": False}}, session
+            )
         )
-        return res.matched_count == 1
+        self._invalidate_account(account_id, before)
+        return before is not None
 
     def delete_account(self, account_id: str) -> bool:
-        res = self.accounts.delete_one({"_id": account_id})
-        return res.deleted_count == 1
+        def write(session: Any) -> Optional[Dict[str, Any]]:
+            before = self.accounts.find_one_and_delete(
+                {"_id": account_id}, projection={"username": 1}, session=session
+            )
+            if before is not None:
+                self._emit("account.deleted", before, session)
+            return before
+
+        before = self._atomic(write)
+        self._invalidate_account(account_id, before)
+        return before is not None
+
+    def _update_account_and_emit(
+        self, account_id: str, update: Dict[str, Any], session: Any
+    ) -> Optional[Dict[str, Any]]:
+        before = self.accounts.find_one_and_update(
+            {"_id": account_id},
+            update,
+            projection={"username": 1},
+            return_document=ReturnDocument.BEFORE,
+            session=session,
+        )
+        if before is not None:
+            # Only the username: password/email changes must not leak here
+            self._emit("account.updated", before, session)
+        return before
+
+    def _cache_account(self, account: Dict[str, Any]) -> None:
+        self.account_cache.set(("id", account["_id"]), account)
+        self.account_cache.set(("username", account["username"]), account)
+
+    def _invalidate_account(
+        self,
+        account_id: str,
+        before: Optional[Dict[str, Any]],
+        new_username: Optional[str] = None,
+    ) -> None:
+        self.account_cache.pop(("id", account_id))
+        if before and before.get("username"):
+            self.account_cache.pop(("username", before["username"]))
+        if new_username:
+            # Drop a possible negative entry for the name being taken
+            self.account_cache.pop(("username", new_username))
 
     def _public_account(self, doc: Dict[str, Any]) -> Dict[str, Any]:
         return {
@@ -391,6 +647,215 @@ class Database:
             "role": doc.get("role"),
         }
 
+    # ---------
+    # Profiles
+    # ---------
+
+    def get_profile(
+        self, username: str, *, limit: int = 20
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Account plus listing summary for a seller page.
+
+        Listings come from one `$facet` aggregation over the
+        (user, createdat) indexes of the hot and archive collections:
+        active listings, recently sold listings and totals in a single
+        round-trip.
+        """
+        account = self.get_account_by_username(username)
+        if not account:
+            return None
+
+        lim = max(1, min(int(limit), 200))
+        user_match = {"$match": {"user": account["username"]}}
+        pipeline = [
+            user_match,
+            {
+                "$unionWith": {
+                    "coll": self.listings_archive.name,
+                    "pipeline": [user_match],
+                }
+            },
+            {"$sort": {"createdat": DESCENDING}},
+            {
+                "$facet": {
+                    "active": [{"$match": {"soldat": None}}, {"$limit": lim}],
+                    "sold": [
+                        {"$match": {"soldat": {"$ne": None}}},
+                        {"$sort": {"soldat": DESCENDING}},
+                        {"$limit": lim},
+                    ],
+                    "totals": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "items": {
+                                    "$sum": {
+                                        "$cond": [{"$eq": ["$type", "item"]}, 1, 0]
+                                    }
+                                },
+                                "requests": {
+                                    "$sum": {
+                                        "$cond": [{"$eq": ["$type", "request"]}, 1, 0]
+                                    }
+                                },
+                                # Missing/null soldat sorts below any string
+                                "sold": {
+                                    "$sum": {
+                                        "$cond": [{"$gt": ["$soldat", None]}, 1, 0]
+                                    }
+                                },
+                            }
+                        }
+                    ],
+                }
+            },
+        ]
+        result = next(self.listings.aggregate(pipeline), None) or {}
+        totals = (result.get("totals") or [{}])[0]
+
+        return {
+            "account": account,
+            "active": [self._public_listing(d) for d in result.get("active", [])],
+            "sold": [self._public_listing(d) for d in result.get("sold", [])],
+            "totals": {
+                "items": totals.get("items", 0),
+                "requests": totals.get("requests", 0),
+                "sold": totals.get("sold", 0),
+            },
+        }
+
+    # ---------
+    # Saved searches
+    # ---------
+
+    def create_saved_search(self, search: SavedSearchInput) -> str:
+        base = validate_saved_search_input(search)
+        doc = {
+            "_id": new_id(),
+            **base,
+            "createdat": _utcnow_iso(),
+        }
+        self.saved_searches.insert_one(doc)
+        return doc["_id"]
+
+    def list_saved_searches(
+        self, accountid: str, *, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        lim = max(1, min(int(limit), 200))
+        cur = (
+            self.saved_searches.find({"accountid": accountid})
+            .sort("createdat", DESCENDING)
+            .limit(lim)
+        )
+        return [self._public_saved_search(d) for d in cur]
+
+    def delete_saved_search(self, search_id: str) -> bool:
+        res = self.saved_searches.delete_one({"_id": search_id})
+        return res.deleted_count == 1
+
+    def match_saved_searches(self, listing: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Saved searches whose keywords all appear in the listing title.
+
+        Candidates come from the keywords index (any shared token), so the
+        cost scales with the number of searches sharing a word with the
+        title rather than with the total number of saved searches.
+        Searches saved after the listing was posted, and the seller's own
+        searches, never match.
+        """
+        tokens = set(tokenize(listing.get("title", "")))
+        if not tokens:
+            return []
+        q: Dict[str, Any] = {
+            "keywords": {"$in": list(tokens)},
+            "type": {"$in": [None, listing.get("type")]},
+            "$or": [
+                {"maxprice": None},
+                {"maxprice": {"$gte": listing.get("price", 0)}},
+            ],
+        }
+        if listing.get("createdat"):
+            q["createdat"] = {"$lte": listing["createdat"]}
+        # Listings store the seller's username, searches the account id
+        seller = self.get_account_by_username(listing.get("user") or "")
+        if seller:
+            q["accountid"] = {"$ne": seller["_id"]}
+        cur = self.saved_searches.find(q, {"accountid": 1, "keywords": 1})
+        return [d for d in cur if tokens.issuperset(d.get("keywords") or [])]
+
+    def notify_saved_searches(self, listing: Dict[str, Any]) -> int:
+        """
+        Queue one notification per matching saved search.
+
+        Notification ids are derived from (search, listing) so a redelivered
+        listing.created event does not notify anyone twice.
+        """
+        now = _utcnow_iso()
+        docs = [
+            {
+                "_id": f"{s['_id']}:{listing['_id']}",
+                "accountid": s["accountid"],
+                "searchid": s["_id"],
+                "listingid": listing["_id"],
+                "title": listing.get("title"),
+                "createdat": now,
+                "isread": False,
+            }
+            for s in self.match_saved_searches(listing)
+        ]
+        if not docs:
+            return 0
+        try:
+            return len(self.notifications.insert_many(docs, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != 11000 for err in errors):
+                raise
+            return e.details.get("nInserted", 0)
+
+    def _public_saved_search(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": doc["_id"],
+            "accountid": doc.get("accountid"),
+            "query": doc.get("query"),
+            "keywords": doc.get("keywords"),
+            "type": doc.get("type"),
+            "maxprice": doc.get("maxprice"),
+            "createdat": doc.get("createdat"),
+        }
+
+    # ---------
+    # Notifications
+    # ---------
+
+    def list_notifications(
+        self, accountid: str, *, unread_only: bool = False, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        q: Dict[str, Any] = {"accountid": accountid}
+        if unread_only:
+            q["isread"] = False
+        lim = max(1, min(int(limit), 200))
+        cur = self.notifications.find(q).sort("createdat", DESCENDING).limit(lim)
+        return [self._public_notification(d) for d in cur]
+
+    def mark_notification_read(self, notification_id: str) -> bool:
+        res = self.notifications.update_one(
+            {"_id": notification_id}, {"$set": {"isread": True}}
+        )
+        return res.matched_count == 1
+
+    def _public_notification(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": doc["_id"],
+            "accountid": doc.get("accountid"),
+            "searchid": doc.get("searchid"),
+            "listingid": doc.get("listingid"),
+            "title": doc.get("title"),
+            "createdat": doc.get("createdat"),
+            "isread": doc.get("isread"),
+        }
+
     # ---------
     # Messages
     # ---------
@@ -402,7 +867,12 @@ class Database:
             **base,
             "timestamp": _utcnow_iso(),
         }
-        self.messages.insert_one(doc)
+
+        def write(session: Any) -> None:
+            self.messages.insert_one(doc, session=session)
+            self._emit("message.created", doc, session)
+
+        self._atomic(write)
         return doc["_id"]
 
     def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
@@ -452,4 +922,10 @@ class Database:
 def get_db_from_env(*, client: Optional[MongoClient] = None) -> Database:
     uri = os.environ["MONGODB_URI"]
     db_name = os.getenv("MONGODB_DB", "SFSU-Marketplace")
-    return Database(uri, db_name=db_name, client=client)
+    outbox_transactions = os.getenv("OUTBOX_TRANSACTIONS", "1") != "0"
+    return Database(
+        uri,
+        db_name=db_name,
+        client=client,
+        outbox_transactions=outbox_transactions,
+    )
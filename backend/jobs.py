@@ -0,0 +1,91 @@
+# jobs.py
+#
+# Periodic maintenance jobs for the API processes.
+#
+# Every Gunicorn worker runs the same lifespan hook, so a job started
+# there runs once per worker. Jobs that act on shared data (stats
+# reconciliation, archival) take a lease first: one document per job in
+# the `jobs` collection records who last ran it and until when nobody
+# else may. Whichever worker finds the lease expired runs the job, so
+# it runs about once per interval per deployment, however many workers
+# or nodes there are.
+#
+# Jobs that build per-process state (the similar-listings index) skip
+# the lease and run in every worker.
+#
+# The first run of each job is delayed by a random jitter so a fresh
+# deployment does not start every job in every worker at once.
+
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+START_JITTER_SECONDS = 30.0
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+class JobLease:
+    """Per-job leases shared by all processes through one collection."""
+
+    def __init__(self, collection: Collection):
+        self.col = collection
+        self.holder = uuid.uuid4().hex
+
+    def acquire(self, name: str, seconds: float) -> bool:
+        """
+        Take the lease on `name` for `seconds` if it is free or expired.
+        Returns False if another process holds it.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            self.col.find_one_and_update(
+                {"_id": name, "lockeduntil": {"$lte": _iso(now)}},
+                {
+                    "$set": {
+                        "lockedby": self.holder,
+                        "lockeduntil": _iso(now + timedelta(seconds=seconds)),
+                        "lastrunat": _iso(now),
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # The document exists but the lease has not expired
+            return False
+        return True
+
+
+async def every(
+    seconds: float,
+    fn: Callable[[], None],
+    name: str,
+    *,
+    lease: Optional[JobLease] = None,
+    jitter: float = START_JITTER_SECONDS,
+) -> None:
+    """
+    Run a blocking job every `seconds` in the threadpool, starting after
+    a random delay of up to `jitter` seconds. With `lease`, the run is
+    skipped unless this process wins the job's lease.
+    """
+    await asyncio.sleep(random.uniform(0, min(jitter, seconds)))
+    while True:
+        try:
+            if lease is None or await run_in_threadpool(lease.acquire, name, seconds):
+                await run_in_threadpool(fn)
+        except Exception:
+            logger.exception("%s failed", name)
+        await asyncio.sleep(seconds)
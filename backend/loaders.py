@@ -0,0 +1,61 @@
+# loaders.py
+#
+# Request-scoped loaders that coalesce duplicate lookups.
+#
+# A single request often needs the same listing or account many times
+# (e.g. one inbox with several conversations about one listing with the
+# same person). A RequestLoader memoizes lookups for the lifetime of one
+# request and batches misses into a single `$in` query per collection.
+#
+# Loaders are never shared between requests, so nothing is served staler
+# than the request that read it.
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from cache import MISSING
+from database import Database
+
+
+class _KeyLoader:
+    """Memoizing batch loader for one collection."""
+
+    def __init__(self, batch_fn: Callable[[List[str]], Dict[str, Dict[str, Any]]]):
+        self._batch_fn = batch_fn
+        self._cache: Dict[str, Any] = {}
+
+    def load_many(self, keys: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        keys = [k for k in dict.fromkeys(keys) if k]
+        misses = [k for k in keys if k not in self._cache]
+        if misses:
+            found = self._batch_fn(misses)
+            for k in misses:
+                # Cache negative results too so unknown ids aren't re-queried.
+                self._cache[k] = found.get(k)
+        return {k: self._cache[k] for k in keys}
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        if not key:
+            return None
+        hit = self._cache.get(key, MISSING)
+        if hit is not MISSING:
+            return hit
+        return self.load_many([key]).get(key)
+
+
+class RequestLoader:
+    """
+    Per-request loader for accounts and listings.
+
+    Use `load_many` up front when the full set of ids is known (one query
+    per collection), or `load` for ad-hoc lookups (deduplicated).
+    """
+
+    def __init__(self, db: Database):
+        self.accounts = _KeyLoader(db.get_accounts_by_ids)
+        self.listings = _KeyLoader(db.get_listings_by_ids)
+
+    def account(self, account_id: str) -> Optional[Dict[str, Any]]:
+        return self.accounts.load(account_id)
+
+    def listing(self, listing_id: str) -> Optional[Dict[str, Any]]:
+        return self.listings.load(listing_id)
@@ -1,26 +1,163 @@
+import asyncio
+import hmac
 import os
 import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 import boto3
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
 from database import (
+    Database,
     ListingInput,
     AccountInput,
     MessageInput,
+    SavedSearchInput,
     get_db_from_env,
     new_id,
 )
+from admission import (
+    DEFAULT_POLICIES,
+    AdmissionController,
+    AdmissionMiddleware,
+    MongoRateLimitStore,
+    parse_trusted_proxies,
+)
+from backup import COLLECTIONS, iter_export
+from jobs import JobLease, every
+from loaders import RequestLoader
+from outbox import HandlerRegistry, OutboxWorker
+from similar import SimilarIndex
 
 load_dotenv(Path(__file__).resolve().parent / ".env")
 
-app = FastAPI(title="SFSU Marketplace API")
+STATS_RECONCILE_SECONDS = float(os.getenv("STATS_RECONCILE_SECONDS", "600"))
+SIMILAR_REBUILD_SECONDS = float(os.getenv("SIMILAR_REBUILD_SECONDS", "900"))
+# New listings created on other workers / nodes are picked up this often
+SIMILAR_POLL_SECONDS = float(os.getenv("SIMILAR_POLL_SECONDS", "5"))
+# Each poll re-reads this far back to cover clock skew between nodes and
+# inserts still in flight during the previous poll (add() is idempotent)
+SIMILAR_POLL_OVERLAP_SECONDS = 60.0
+# How long shutdown waits for the outbox worker's current event; keep it
+# below serve.py's GRACEFUL_TIMEOUT
+OUTBOX_DRAIN_SECONDS = float(os.getenv("OUTBOX_DRAIN_SECONDS", "20"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# "memory" (per worker) or "mongo" (shared across workers and nodes)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Peers whose X-Forwarded-For is believed (comma-separated IPs / CIDRs)
+TRUSTED_PROXIES = parse_trusted_proxies(
+    os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1")
+)
+
+
+def _rebuild_similar() -> None:
+    similar_index.rebuild(db.iter_active_titles())
+
+
+_similar_since: Optional[str] = None
+
+
+def _poll_similar() -> None:
+    """Add listings created since the last poll, by any worker."""
+    global _similar_since
+    since = _similar_since
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=SIMILAR_POLL_OVERLAP_SECONDS
+    )
+    _similar_since = cutoff.isoformat().replace("+00:00", "Z")
+    for listing_id, title in db.iter_active_titles(since=since or _similar_since):
+        similar_index.add(listing_id, title)
+
+
+def _archive_sold() -> None:
+    db.archive_sold_listings(older_than_days=ARCHIVE_AFTER_DAYS)
+
+
+# --------------- Outbox handlers ---------------
+#
+# Post-write side effects run here, off the request path. Delivery is
+# at-least-once, so every handler must be idempotent.
+
+outbox_handlers = HandlerRegistry()
+outbox_worker = OutboxWorker(outbox_handlers)
+
+
+@outbox_handlers.on("listing.created")
+def _match_saved_searches(event: dict) -> None:
+    db.notify_saved_searches(event["payload"])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-process startup/shutdown.
+
+    The MongoClient is created here rather than at import so that a
+    pre-forking server (see serve.py) can preload this module in the
+    master and every worker still gets its own client after fork().
+    """
+    global db
+    db = await run_in_threadpool(get_db_from_env)
+    if RATE_LIMIT_BACKEND == "mongo":
+        admission.store = await run_in_threadpool(
+            MongoRateLimitStore, db.accounts.database["ratelimits"]
+        )
+
+    # Stats and archival act on shared collections, so one worker per
+    # deployment runs them; the similar index lives in each worker.
+    lease = JobLease(db.accounts.database["jobs"])
+    tasks = [
+        asyncio.create_task(
+            every(
+                STATS_RECONCILE_SECONDS,
+                db.reconcile_listing_stats,
+                "stats-reconcile",
+                lease=lease,
+            )
+        ),
+        asyncio.create_task(
+            every(ARCHIVE_INTERVAL_SECONDS, _archive_sold, "archive-sold", lease=lease)
+        ),
+        asyncio.create_task(
+            every(SIMILAR_REBUILD_SECONDS, _rebuild_similar, "similar-rebuild")
+        ),
+        asyncio.create_task(
+            every(SIMILAR_POLL_SECONDS, _poll_similar, "similar-poll")
+        ),
+    ]
+    outbox_task = asyncio.create_task(outbox_worker.run(db.outbox))
+    try:
+        yield
+    finally:
+        # The server has stopped accepting and drained in-flight requests
+        # by now; stop background jobs before closing the client they use.
+        # Cancelling does not stop a handler already running in a thread,
+        # so the outbox worker is asked to stop and awaited instead.
+        outbox_worker.stop()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.wait([outbox_task], timeout=OUTBOX_DRAIN_SECONDS)
+        outbox_task.cancel()
+        db.close()
+
+
+app = FastAPI(title="SFSU Marketplace API", lifespan=lifespan)
+
+admission = AdmissionController(
+    DEFAULT_POLICIES, trusted_proxies=TRUSTED_PROXIES
+)
+app.add_middleware(AdmissionMiddleware, controller=admission)
 
 origins = [
     "http://localhost:3000",
@@ -34,7 +171,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-db = get_db_from_env()
+# Created per worker process in lifespan()
+db: Database = None  # type: ignore[assignment]
+similar_index = SimilarIndex()
 
 # --------------- R2 / S3 client ---------------
 
@@ -54,6 +193,11 @@ def _get_s3():
     return _s3
 
 
+def get_loader() -> RequestLoader:
+    """Dependency: a fresh RequestLoader for each incoming request."""
+    return RequestLoader(db)
+
+
 R2_BUCKET = os.getenv("R2_BUCKET", "sf-hacks-marketplace")
 
 
@@ -87,6 +231,12 @@ class SendMessageBody(BaseModel):
     conversationid: Optional[str] = None
 
 
+class SavedSearchBody(BaseModel):
+    keywords: str
+    type: Optional[str] = None
+    maxprice: Optional[float] = None
+
+
 # --------------- Helpers ---------------
 
 
@@ -115,6 +265,16 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Per-worker admission counters and outbox lag."""
+    return {
+        "pid": os.getpid(),
+        "admission": admission.metrics(),
+        "outbox": outbox_worker.metrics(db.outbox),
+    }
+
+
 # --------------- Listings ---------------
 
 
@@ -135,6 +295,12 @@ def get_featured_listings(limit: int = Query(10, ge=1, le=50)):
     return db.list_listings(type="item", include_sold=False, limit=limit)
 
 
+@app.get("/listings/stats")
+def get_listing_stats(days: int = Query(7, ge=1, le=30)):
+    """Browse-page counters, read from the precomputed stats document."""
+    return db.listing_stats(days=days)
+
+
 @app.get("/listings/{listing_id}")
 def get_listing(listing_id: str):
     listing = db.get_listing(listing_id)
@@ -157,14 +323,34 @@ def create_listing(body: CreateListingBody):
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    similar_index.add(listing_id, body.title)
     return {"id": listing_id}
 
 
+@app.get("/listings/{listing_id}/similar")
+def get_similar_listings(listing_id: str, limit: int = Query(8, ge=1, le=50)):
+    """Active listings with the most similar titles (cosine over trigrams)."""
+    listing = db.get_listing(listing_id)
+    if not listing:
+        raise HTTPException(status_code=404, detail="Listing not found")
+
+    hits = similar_index.query(
+        listing_id=listing_id, title=listing["title"], k=limit
+    )
+    found = db.get_listings_by_ids([lid for lid, _ in hits])
+    return [
+        {**found[lid], "score": round(score, 4)}
+        for lid, score in hits
+        if lid in found and not found[lid]["soldat"]
+    ]
+
+
 @app.patch("/listings/{listing_id}/sold")
 def mark_listing_sold(listing_id: str):
     ok = db.mark_listing_sold(listing_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Listing not found")
+    similar_index.remove(listing_id)
     return {"ok": True}
 
 
@@ -173,6 +359,7 @@ def delete_listing(listing_id: str):
     ok = db.delete_listing(listing_id)
     if not ok:
         raise HTTPException(status_code=404, detail="Listing not found")
+    similar_index.remove(listing_id)
     return {"ok": True}
 
 
@@ -201,7 +388,7 @@ def register(body: RegisterBody):
 
 @app.post("/auth/login")
 def login(body: LoginBody):
-    account = db.get_account_by_username(body.username)
+    account = db.get_account_for_login(body.username)
     if not account:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -230,6 +417,67 @@ def get_account(account_id: str):
     return _safe_account(account)
 
 
+# --------------- Saved Searches ---------------
+
+
+@app.post("/accounts/{account_id}/saved-searches", status_code=201)
+def create_saved_search(account_id: str, body: SavedSearchBody):
+    try:
+        search_id = db.create_saved_search(
+            SavedSearchInput(
+                accountid=account_id,
+                keywords=body.keywords,
+                type=body.type,
+                maxprice=body.maxprice,
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"id": search_id}
+
+
+@app.get("/accounts/{account_id}/saved-searches")
+def list_saved_searches(account_id: str, limit: int = Query(50, ge=1, le=200)):
+    return db.list_saved_searches(account_id, limit=limit)
+
+
+@app.delete("/saved-searches/{search_id}")
+def delete_saved_search(search_id: str):
+    ok = db.delete_saved_search(search_id)
+    if not ok:
+        raise HTTPException(status_code=404, detail="Saved search not found")
+    return {"ok": True}
+
+
+@app.get("/accounts/{account_id}/notifications")
+def list_notifications(
+    account_id: str,
+    unread_only: bool = Query(False),
+    limit: int = Query(50, ge=1, le=200),
+):
+    return db.list_notifications(account_id, unread_only=unread_only, limit=limit)
+
+
+@app.patch("/notifications/{notification_id}/read")
+def mark_notification_read(notification_id: str):
+    ok = db.mark_notification_read(notification_id)
+    if not ok:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return {"ok": True}
+
+
+# --------------- Profiles ---------------
+
+
+@app.get("/profiles/{username}")
+def get_profile(username: str, limit: int = Query(20, ge=1, le=200)):
+    """Public seller profile: account, active/sold listings and totals."""
+    profile = db.get_profile(username, limit=limit)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return {**profile, "account": _safe_account(profile["account"])}
+
+
 # --------------- Messages ---------------
 
 
@@ -266,7 +514,7 @@ def list_messages(
 
 
 @app.get("/messages/conversations/{user_id}")
-def list_conversations(user_id: str):
+def list_conversations(user_id: str, loader: RequestLoader = Depends(get_loader)):
     """Aggregated conversation previews for a user's inbox."""
     pipeline = [
         {
@@ -293,16 +541,21 @@ def list_conversations(user_id: str):
 
     results = list(db.messages.aggregate(pipeline))
 
+    def _other(r: dict) -> str:
+        return r["recipientid"] if r["senderid"] == user_id else r["senderid"]
+
+    # One batched query per collection instead of two find_one per row
+    loader.listings.load_many(r.get("listingid") for r in results)
+    loader.accounts.load_many(_other(r) for r in results)
+
     conversations = []
     for r in results:
-        other_id = (
-            r["recipientid"] if r["senderid"] == user_id else r["senderid"]
-        )
+        other_id = _other(r)
 
-        listing = db.listings.find_one({"_id": r["listingid"]}, {"title": 1})
+        listing = loader.listing(r.get("listingid"))
         listing_title = listing["title"] if listing else "Unknown listing"
 
-        other_acct = db.accounts.find_one({"_id": other_id}, {"username": 1})
+        other_acct = loader.account(other_id)
         other_name = other_acct["username"] if other_acct else "Unknown user"
 
         conversations.append(
@@ -355,6 +608,39 @@ def mark_message_read(message_id: str):
     return {"ok": True}
 
 
+# --------------- Admin ---------------
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Admin routes are disabled unless ADMIN_TOKEN is set and matches."""
+    expected = os.getenv("ADMIN_TOKEN")
+    # Constant-time comparison so the token cannot be guessed by timing
+    if not expected or not hmac.compare_digest(
+        (x_admin_token or "").encode(), expected.encode()
+    ):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/admin/export", dependencies=[Depends(require_admin)])
+def export_collections(
+    collections: List[str] = Query(list(COLLECTIONS)),
+    gzip: bool = Query(False),
+):
+    """Stream collections as NDJSON (see backup.py for the format)."""
+    bad = [c for c in collections if c not in COLLECTIONS]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Unknown collection: {bad[0]}")
+
+    headers = {"Content-Disposition": "attachment; filename=export.ndjson"}
+    if gzip:
+        headers["Content-Disposition"] += ".gz"
+    return StreamingResponse(
+        iter_export(db, collections, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers=headers,
+    )
+
+
 # --------------- Upload ---------------
 
 
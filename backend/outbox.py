@@ -0,0 +1,206 @@
+# outbox.py
+#
+# Transactional outbox consumer.
+#
+# Database write methods append an event document to the `outbox`
+# collection in the same transaction as the write (see Database._atomic).
+# OutboxWorker is an asyncio task that claims pending events in batches,
+# runs the handlers registered for each topic in the threadpool and
+# deletes events once every handler has succeeded.
+#
+# Delivery is at-least-once: an event whose lease expires (worker crash)
+# or whose handler raises is retried with exponential backoff, up to
+# MAX_ATTEMPTS, after which it is parked with status "failed". Handlers
+# must therefore be idempotent.
+#
+# Any number of workers (processes or nodes) may run concurrently; each
+# claims a disjoint batch via a lease token.
+#
+# On shutdown call stop() and await the run() task: the handler thread
+# is not interrupted by task cancellation, so run() returns only after
+# the current event, releasing the rest of the batch for other workers.
+
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List
+
+from pymongo import ASCENDING
+from pymongo.collection import Collection
+from starlette.concurrency import run_in_threadpool
+
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+BATCH_SIZE = 100
+LEASE_SECONDS = 60.0
+POLL_SECONDS = 0.5
+MAX_ATTEMPTS = 8
+BACKOFF_SECONDS = 2.0
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def ensure_outbox_indexes(col: Collection) -> None:
+    col.create_index(
+        [("status", ASCENDING), ("availableat", ASCENDING), ("createdat", ASCENDING)]
+    )
+    col.create_index([("lockedby", ASCENDING)])
+
+
+class HandlerRegistry:
+    """Topic -> handlers. Register with `@registry.on("listing.created")`."""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+
+    def on(self, topic: str) -> Callable[[Handler], Handler]:
+        def register(fn: Handler) -> Handler:
+            self._handlers[topic].append(fn)
+            return fn
+
+        return register
+
+    def for_topic(self, topic: str) -> List[Handler]:
+        return self._handlers.get(topic, [])
+
+
+class OutboxWorker:
+    """Batching, retrying consumer for the outbox collection."""
+
+    def __init__(
+        self,
+        registry: HandlerRegistry,
+        *,
+        batch_size: int = BATCH_SIZE,
+        poll_seconds: float = POLL_SECONDS,
+    ):
+        self.registry = registry
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.worker_id = uuid.uuid4().hex
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.last_batch_seconds = 0.0
+        # Checked from the handler thread, hence not an asyncio.Event
+        self._stopping = threading.Event()
+
+    # -- claiming / acking (blocking; run in the threadpool) --
+
+    def claim(self, col: Collection) -> List[Dict[str, Any]]:
+        now = _now()
+        ready = {
+            "status": "pending",
+            "availableat": {"$lte": _iso(now)},
+            "$or": [{"lockeduntil": None}, {"lockeduntil": {"$lte": _iso(now)}}],
+        }
+        ids = [
+            d["_id"]
+            for d in col.find(ready, {"_id": 1})
+            .sort("createdat", ASCENDING)
+            .limit(self.batch_size)
+        ]
+        if not ids:
+            return []
+        token = f"{self.worker_id}:{uuid.uuid4().hex}"
+        lease = _iso(now + timedelta(seconds=LEASE_SECONDS))
+        # Re-check readiness so two workers never claim the same event
+        col.update_many(
+            {"_id": {"$in": ids}, **ready},
+            {"$set": {"lockedby": token, "lockeduntil": lease}},
+        )
+        return list(col.find({"lockedby": token}).sort("createdat", ASCENDING))
+
+    def process(self, col: Collection, events: List[Dict[str, Any]]) -> None:
+        done: List[str] = []
+        for n, event in enumerate(events):
+            if self._stopping.is_set():
+                self._release(col, events[n:])
+                break
+            try:
+                for handler in self.registry.for_topic(event["topic"]):
+                    handler(event)
+            except Exception as e:
+                self._retry(col, event, e)
+            else:
+                done.append(event["_id"])
+        if done:
+            col.delete_many({"_id": {"$in": done}})
+            self.processed += len(done)
+
+    def _release(self, col: Collection, events: List[Dict[str, Any]]) -> None:
+        """Hand unprocessed events back without waiting for the lease."""
+        col.update_many(
+            {
+                "_id": {"$in": [e["_id"] for e in events]},
+                "lockedby": events[0]["lockedby"],
+            },
+            {"$set": {"lockedby": None, "lockeduntil": None}},
+        )
+
+    def _retry(self, col: Collection, event: Dict[str, Any], err: Exception) -> None:
+        attempts = int(event.get("attempts", 0)) + 1
+        update: Dict[str, Any] = {
+            "attempts": attempts,
+            "lasterror": str(err)[:500],
+            "lockedby": None,
+            "lockeduntil": None,
+        }
+        if attempts >= MAX_ATTEMPTS:
+            update["status"] = "failed"
+            self.failed += 1
+        else:
+            delay = BACKOFF_SECONDS * (2 ** (attempts - 1))
+            update["availableat"] = _iso(_now() + timedelta(seconds=delay))
+            self.retried += 1
+        col.update_one({"_id": event["_id"]}, {"$set": update})
+
+    # -- loop --
+
+    def stop(self) -> None:
+        """Make run() return once the event in progress has finished."""
+        self._stopping.set()
+
+    async def run(self, col: Collection) -> None:
+        while not self._stopping.is_set():
+            try:
+                events = await run_in_threadpool(self.claim, col)
+                if events:
+                    started = time.perf_counter()
+                    await run_in_threadpool(self.process, col, events)
+                    self.last_batch_seconds = time.perf_counter() - started
+                    continue
+            except Exception:
+                logger.exception("Outbox worker error")
+            await asyncio.sleep(self.poll_seconds)
+
+    def metrics(self, col: Collection) -> Dict[str, Any]:
+        oldest = col.find_one(
+            {"status": "pending"}, {"createdat": 1}, sort=[("createdat", ASCENDING)]
+        )
+        lag = 0.0
+        if oldest:
+            created = datetime.fromisoformat(oldest["createdat"].replace("Z", "+00:00"))
+            lag = max(0.0, (_now() - created).total_seconds())
+        return {
+            "pending": col.count_documents({"status": "pending"}),
+            "deadletter": col.count_documents({"status": "failed"}),
+            "lagseconds": round(lag, 3),
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lastbatchseconds": round(self.last_batch_seconds, 4),
+        }
@@ -0,0 +1,283 @@
+# schema.py
+#
+# Declarative document schemas, compiled once into validators.
+#
+# Each Field is turned into a single check function at import time that
+# closes over the field's rules, so nothing about a rule is looked up per
+# call. A listing validates in roughly 1.3x the time of the hand-written
+# validator it replaced (see bench_validation.py).
+#
+# The field rules mirror the `$jsonSchema` validators on the Atlas
+# collections and are the single source of truth for write validation:
+# Database.create_* / update_* and the bulk import path all go through
+# the validators below. `Schema.json_schema()` renders the equivalent
+# Atlas validator so the two can be diffed or applied with collMod.
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple
+
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+_Check = Callable[[Any], Any]
+_ABSENT = object()
+
+
+@dataclass(frozen=True)
+class Field:
+    """
+    Rules for one document field.
+
+    kind is "string", "int" or "bool". `source` is the attribute name on
+    the input object when it differs from the stored field name; error
+    messages use it so they refer to what the caller sent. `normalize`
+    runs first; the declared rules then apply to its result.
+    """
+
+    kind: str
+    required: bool = True
+    nullable: bool = False
+    max_length: Optional[int] = None
+    min_length: Optional[int] = None
+    minimum: Optional[int] = None
+    enum: Optional[Tuple[str, ...]] = None
+    pattern: Optional[Pattern] = None
+    pattern_message: str = "is invalid"
+    lower: bool = False
+    default: Any = None
+    normalize: Optional[Callable[[Any], Any]] = None
+    source: Optional[str] = None
+
+
+def _string_check(label: str, f: Field, partial: bool) -> _Check:
+    nullable = f.nullable
+    normalize = f.normalize
+    # Enum fields report the allowed values rather than "is required"
+    required = f.required and f.enum is None
+    max_length = f.max_length
+    lower = f.lower
+    min_length = f.min_length
+    match = f.pattern.match if f.pattern is not None else None
+    allowed = frozenset(f.enum) if f.enum is not None else None
+    # Most fields stop after the length check
+    extra = lower or min_length is not None or match or allowed is not None
+
+    required_msg = f"{label} is required"
+    max_msg = f"{label} must be <= {max_length} characters"
+    min_msg = f"{label} must be at least {min_length} characters"
+    pattern_msg = f"{label} {f.pattern_message}"
+    enum_msg = f"{label} must be " + " or ".join(f"'{e}'" for e in f.enum or ())
+
+    def check(v: Any) -> Optional[str]:
+        if normalize is not None:
+            v = normalize(v)
+        if v is None and nullable:
+            return None
+        v = v.strip() if v.__class__ is str else str(v or "").strip()
+        if required and not v:
+            raise ValueError(required_msg)
+        if max_length is not None and len(v) > max_length:
+            raise ValueError(max_msg)
+        if extra:
+            if lower:
+                v = v.lower()
+            if min_length is not None and len(v) < min_length:
+                raise ValueError(min_msg)
+            if match is not None and not match(v):
+                raise ValueError(pattern_msg)
+            if allowed is not None and v not in allowed:
+                raise ValueError(enum_msg)
+        return v
+
+    return check
+
+
+def _int_check(label: str, f: Field, partial: bool) -> _Check:
+    nullable = f.nullable
+    normalize = f.normalize
+    minimum = f.minimum
+    number_msg = f"{label} must be a number"
+    minimum_msg = f"{label} must be >= {minimum}"
+
+    def check(v: Any) -> Optional[int]:
+        if normalize is not None:
+            v = normalize(v)
+        if v.__class__ is not int:
+            if v is None and nullable:
+                return None
+            # A missing value in a new document means 0; an explicit None
+            # or "" in an update is a bad value
+            if not partial:
+                v = v or 0
+            try:
+                v = int(float(v))
+            except (TypeError, ValueError):
+                raise ValueError(number_msg)
+        if minimum is not None and v < minimum:
+            raise ValueError(minimum_msg)
+        return v
+
+    return check
+
+
+def _bool_check(label: str, f: Field, partial: bool) -> _Check:
+    nullable = f.nullable
+    normalize = f.normalize
+    msg = f"{label} must be a boolean"
+
+    def check(v: Any) -> Optional[bool]:
+        if normalize is not None:
+            v = normalize(v)
+        if v.__class__ is not bool:
+            if v is None and nullable:
+                return None
+            raise ValueError(msg)
+        return v
+
+    return check
+
+
+_KIND_CHECKS = {"string": _string_check, "int": _int_check, "bool": _bool_check}
+
+
+def _field_check(name: str, f: Field, *, partial: bool = False) -> _Check:
+    """
+    Single function applying every rule `f` declares to one value:
+    `normalize` first, then the null check, then the kind's rules.
+    """
+    make = _KIND_CHECKS.get(f.kind)
+    if make is None:
+        raise ValueError(f"unknown field kind: {f.kind}")
+    return make(f.source or name, f, partial)
+
+
+class Schema:
+    """A set of Fields compiled into validators."""
+
+    def __init__(self, fields: Dict[str, Field]):
+        self.fields = fields
+        # (stored name, input key, default, check); the input key is the
+        # `source` attribute if any, falling back to the stored name
+        self._plan: List[Tuple[str, str, Any, _Check]] = [
+            (name, f.source or name, f.default, _field_check(name, f))
+            for name, f in fields.items()
+        ]
+        self._checks: Dict[str, _Check] = {
+            name: _field_check(name, f, partial=True) for name, f in fields.items()
+        }
+
+    def validate(self, obj: Any) -> Dict[str, Any]:
+        """Validate a full document from a dataclass or mapping."""
+        get = (obj if isinstance(obj, dict) else vars(obj)).get
+        out: Dict[str, Any] = {}
+        for name, key, default, check in self._plan:
+            v = get(key, _ABSENT)
+            if v is _ABSENT:
+                v = get(name, default)
+            out[name] = check(v)
+        return out
+
+    def validate_partial(self, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate only the known fields present in `updates`."""
+        out: Dict[str, Any] = {}
+        for k, v in (updates or {}).items():
+            check = self._checks.get(k)
+            if check is not None:
+                out[k] = check(v)
+        return out
+
+    def json_schema(self) -> Dict[str, Any]:
+        """Equivalent Atlas `$jsonSchema` (without _id / server-set fields)."""
+        props: Dict[str, Any] = {}
+        for name, f in self.fields.items():
+            p: Dict[str, Any] = {"bsonType": f.kind}
+            if f.nullable:
+                p["bsonType"] = [f.kind, "null"]
+            if f.max_length is not None:
+                p["maxLength"] = f.max_length
+            if f.min_length is not None:
+                p["minLength"] = f.min_length
+            if f.minimum is not None:
+                p["minimum"] = f.minimum
+            if f.enum is not None:
+                p["enum"] = list(f.enum)
+            if f.pattern is not None:
+                p["pattern"] = f.pattern.pattern
+            props[name] = p
+        return {
+            "bsonType": "object",
+            "required": [n for n, f in self.fields.items() if f.required],
+            "properties": props,
+        }
+
+
+_LISTING_TYPES = {
+    **dict.fromkeys(("request", "req", "requests"), "request"),
+    **dict.fromkeys(("item", "items", "listing", "listings"), "item"),
+}
+
+
+def normalize_listing_type(t: Any) -> str:
+    # Exact spellings skip the string clean-up
+    v = _LISTING_TYPES.get(t) if t.__class__ is str else None
+    if v is None:
+        v = _LISTING_TYPES.get(str(t or "").strip().lower())
+    if v is None:
+        raise ValueError("type must be 'request(s)' or 'item'")
+    return v
+
+
+LISTING_SCHEMA = Schema(
+    {
+        "type": Field(
+            "string", enum=("item", "request"), normalize=normalize_listing_type
+        ),
+        "title": Field("string", max_length=140),
+        "price": Field("int", minimum=0, default=0),
+        # Schema requires imagekey as a string (use "" for no image)
+        "imagekey": Field("string", required=False, source="image_key"),
+        "user": Field("string", max_length=80),
+    }
+)
+
+ACCOUNT_SCHEMA = Schema(
+    {
+        "username": Field("string", max_length=40),
+        "password": Field("string", max_length=200, min_length=8),
+        "email": Field(
+            "string",
+            max_length=254,
+            pattern=EMAIL_RE,
+            pattern_message="must be a valid email address",
+        ),
+        "isactive": Field("bool", default=True),
+        "role": Field("string", enum=("user", "admin"), lower=True, default="user"),
+    }
+)
+
+MESSAGE_SCHEMA = Schema(
+    {
+        "senderid": Field("string", max_length=50),
+        "recipientid": Field("string", max_length=50),
+        "conversationid": Field("string", max_length=50),
+        "listingid": Field("string", max_length=50),
+        "message": Field("string", max_length=4000),
+        "isread": Field("bool", default=False),
+    }
+)
+
+SAVED_SEARCH_SCHEMA = Schema(
+    {
+        "accountid": Field("string", max_length=50),
+        "query": Field("string", max_length=140, source="keywords"),
+        "type": Field(
+            "string",
+            required=False,
+            nullable=True,
+            enum=("item", "request"),
+            normalize=lambda t: normalize_listing_type(t) if t else None,
+        ),
+        "maxprice": Field("int", required=False, nullable=True, minimum=0),
+    }
+)
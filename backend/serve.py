@@ -0,0 +1,74 @@
+"""Production entrypoint: pre-forking Gunicorn master with Uvicorn workers.
+
+The app module is imported once in the master (preload_app) and forked
+into WEB_CONCURRENCY workers. Each worker opens its own MongoClient in
+the FastAPI lifespan hook, so no client is shared across fork().
+
+Maintenance jobs (see jobs.py) are scheduled in every worker, but the
+ones that touch shared data take a Mongo lease so they run once per
+deployment. The similar-listings index is rebuilt in, and held by, each
+worker: budget roughly 50 MB of RAM per worker per 100k active listings.
+
+On SIGTERM the master stops accepting connections and gives workers
+GRACEFUL_TIMEOUT seconds to finish in-flight requests and run lifespan
+shutdown before they are killed.
+
+Environment:
+  HOST / PORT          bind address (default 0.0.0.0:8000)
+  WEB_CONCURRENCY      worker processes (default: one per CPU)
+  GRACEFUL_TIMEOUT     seconds to drain on shutdown (default 30)
+  KEEPALIVE            keep-alive seconds (default 5)
+  MAX_REQUESTS         recycle a worker after N requests (default 0 = off)
+
+Requires the gunicorn and uvicorn-worker packages in addition to the
+API's own dependencies (uvicorn's bundled worker class is deprecated):
+
+  pip install gunicorn uvicorn-worker
+
+Usage:
+  python serve.py
+"""
+
+import os
+from typing import Any, Dict
+
+from gunicorn.app.base import BaseApplication
+
+
+def _int_env(name: str, default: int) -> int:
+    return int(os.getenv(name) or default)
+
+
+def gunicorn_options() -> Dict[str, Any]:
+    max_requests = _int_env("MAX_REQUESTS", 0)
+    return {
+        "bind": f"{os.getenv('HOST', '0.0.0.0')}:{_int_env('PORT', 8000)}",
+        "workers": _int_env("WEB_CONCURRENCY", os.cpu_count() or 1),
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "preload_app": True,
+        "graceful_timeout": _int_env("GRACEFUL_TIMEOUT", 30),
+        "timeout": _int_env("GRACEFUL_TIMEOUT", 30) + 30,
+        "keepalive": _int_env("KEEPALIVE", 5),
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests // 10,
+        "accesslog": "-",
+    }
+
+
+class MarketplaceServer(BaseApplication):
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+
+        return app
+
+
+if __name__ == "__main__":
+    MarketplaceServer(gunicorn_options()).run()
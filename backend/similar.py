@@ -0,0 +1,184 @@
+# similar.py
+#
+# In-process "similar listings" index.
+#
+# Each active listing title is embedded as an L2-normalized hashed
+# character-trigram vector and stored as one row of a float32 NumPy
+# matrix. A query is one matrix-vector product (cosine similarity) plus
+# argpartition for the top k, which stays in the low milliseconds at
+# 100k rows with the default 128 dimensions (~50 MB; the product is
+# memory-bound, so dimensions trade recall for latency).
+#
+# Each worker process holds its own index. The API routes update it
+# incrementally, a short delta poll adds listings created by other
+# workers and nodes, and a periodic full rebuild from Mongo drops sold
+# and deleted listings made elsewhere (the /similar route also re-checks
+# hits against Mongo, so those are never served in the meantime).
+# Adds and removes that land while a rebuild is streaming titles are
+# journaled and replayed onto the fresh index before it is swapped in.
+#
+# The lock only guards bookkeeping; query() runs the matrix product on
+# a snapshot outside it, so writers and other queries are not blocked
+# behind NumPy work.
+
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+SIMILAR_DIM = 128
+# Hashed trigrams collide at low dimensions; below this score matches are
+# mostly noise (e.g. "Wooden Chair" vs "Bike Lock" scores ~0.1).
+MIN_SCORE = 0.2
+_INITIAL_ROWS = 1024
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def embed_title(title: str, *, dim: int = SIMILAR_DIM) -> np.ndarray:
+    """Hashed character-trigram vector for a title, L2-normalized."""
+    vec = np.zeros(dim, dtype=np.float32)
+    text = _NON_ALNUM_RE.sub(" ", str(title or "").lower()).strip()
+    for word in text.split():
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            # crc32 is stable across processes, unlike hash()
+            vec[zlib.crc32(padded[i : i + 3].encode()) % dim] += 1.0
+    norm = float(np.linalg.norm(vec))
+    if norm:
+        vec /= norm
+    return vec
+
+
+class SimilarIndex:
+    """Thread-safe cosine-similarity index over active listing titles."""
+
+    def __init__(self, *, dim: int = SIMILAR_DIM):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        # (listing_id, vector or None for a remove) while rebuilding
+        self._journal: Optional[List[Tuple[str, Optional[np.ndarray]]]] = None
+        self._reset(_INITIAL_ROWS)
+
+    def _reset(self, capacity: int) -> None:
+        self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, listing_id: str, title: str) -> None:
+        vec = embed_title(title, dim=self.dim)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((listing_id, vec))
+            self._set_row(listing_id, vec)
+
+    def _set_row(self, listing_id: str, vec: np.ndarray) -> None:
+        row = self._rows.get(listing_id)
+        if row is None:
+            row = self._free.pop() if self._free else self._append_row()
+            self._rows[listing_id] = row
+            self._ids[row] = listing_id
+        self._matrix[row] = vec
+
+    def remove(self, listing_id: str) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((listing_id, None))
+            self._clear_row(listing_id)
+
+    def _clear_row(self, listing_id: str) -> None:
+        row = self._rows.pop(listing_id, None)
+        if row is None:
+            return
+        # A zero row scores 0 and is skipped in query()
+        self._matrix[row] = 0.0
+        self._ids[row] = None
+        self._free.append(row)
+
+    def rebuild(self, listings: Iterable[Tuple[str, str]]) -> None:
+        """
+        Replace the index contents with (id, title) pairs. Writes made
+        while `listings` is being consumed are replayed on top, so a
+        listing added or removed mid-rebuild is not lost or resurrected.
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                self._journal = []
+            try:
+                fresh = SimilarIndex(dim=self.dim)
+                for listing_id, title in listings:
+                    fresh.add(listing_id, title)
+            except BaseException:
+                with self._lock:
+                    self._journal = None
+                raise
+            with self._lock:
+                for listing_id, vec in self._journal:
+                    if vec is None:
+                        fresh._clear_row(listing_id)
+                    else:
+                        fresh._set_row(listing_id, vec)
+                self._journal = None
+                self._matrix = fresh._matrix
+                self._ids = fresh._ids
+                self._rows = fresh._rows
+                self._free = fresh._free
+
+    def query(
+        self,
+        *,
+        listing_id: Optional[str] = None,
+        title: Optional[str] = None,
+        k: int = 10,
+        min_score: float = MIN_SCORE,
+    ) -> List[Tuple[str, float]]:
+        """
+        Top-k (id, score) most similar to an indexed listing or to a
+        free-text title. The listing itself is never returned.
+        """
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return []
+            # Rows are only ever appended or overwritten in place and a
+            # grow or rebuild swaps in a new array, so this view stays
+            # valid (if slightly stale) after the lock is released.
+            matrix = self._matrix[:n]
+            ids = self._ids[:n]
+            row = self._rows.get(listing_id) if listing_id else None
+            if row is not None:
+                vec = matrix[row].copy()
+        if row is None:
+            vec = embed_title(title or "", dim=self.dim)
+
+        scores = matrix @ vec
+        if row is not None:
+            scores[row] = -1.0
+        k = max(1, min(int(k), n))
+        top = np.argpartition(scores, n - k)[n - k :]
+        top = top[np.argsort(-scores[top])]
+        hits = [
+            (ids[i], float(scores[i]))
+            for i in top
+            if scores[i] >= min_score and ids[i] is not None
+        ]
+        with self._lock:
+            # Drop listings removed while the product was running
+            return [(i, score) for i, score in hits if i in self._rows]
+
+    def _append_row(self) -> int:
+        row = len(self._ids)
+        if row >= self._matrix.shape[0]:
+            grown = np.zeros((row * 2, self.dim), dtype=np.float32)
+            grown[:row] = self._matrix[:row]
+            self._matrix = grown
+        self._ids.append(None)
+        return row
@@ -0,0 +1,161 @@
+# stats.py
+#
+# Precomputed marketplace counters for the browse page.
+#
+# All counters live in a single document in the `listing_stats`
+# collection and are bumped with `$inc` from the Database write paths,
+# so reading them is one find_one regardless of how many listings exist:
+#
+#   {
+#     "_id": "listings",
+#     "type":      {"item": {"active": n, "sold": n}, "request": {...}},
+#     "price":     {"item": {"0-9": n, "10-24": n, ...}, ...},   # active only
+#     "soldbyday": {"2026-10-19": n, ...},
+#     "reconciledat": "<ISO-8601>",
+#   }
+#
+# Increments are not transactional with the listing write, so a periodic
+# `reconcile()` recomputes the document from `listings` to correct drift.
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo.collection import Collection
+
+
+STATS_ID = "listings"
+
+# Lower bounds of the price histogram buckets (integer dollars)
+PRICE_BUCKETS = [0, 10, 25, 50, 100, 250, 500]
+
+# How many days of per-day sold counters reconcile() keeps
+SOLD_HISTORY_DAYS = 30
+
+
+def price_bucket(price: Any) -> str:
+    """Histogram label for a price, e.g. 12 -> "10-24", 900 -> "500+"."""
+    try:
+        p = int(price or 0)
+    except (TypeError, ValueError):
+        p = 0
+    for lo, hi in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:]):
+        if p < hi:
+            return f"{lo}-{hi - 1}"
+    return f"{PRICE_BUCKETS[-1]}+"
+
+
+def _contributions(doc: Optional[Dict[str, Any]]) -> Counter:
+    """Counter paths a single listing document adds to the stats document."""
+    c: Counter = Counter()
+    if not doc:
+        return c
+    t = doc.get("type") or "item"
+    soldat = doc.get("soldat")
+    if soldat:
+        c[f"type.{t}.sold"] += 1
+        c[f"soldbyday.{str(soldat)[:10]}"] += 1
+    else:
+        c[f"type.{t}.active"] += 1
+        c[f"price.{t}.{price_bucket(doc.get('price'))}"] += 1
+    return c
+
+
+def _unflatten(flat: Dict[str, int]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for path, n in flat.items():
+        node = out
+        *parents, leaf = path.split(".")
+        for p in parents:
+            node = node.setdefault(p, {})
+        node[leaf] = n
+    return out
+
+
+class ListingStats:
+    """Incrementally maintained listing counters."""
+
+    def __init__(self, collection: Collection):
+        self.col = collection
+
+    def apply(
+        self,
+        before: Optional[Dict[str, Any]],
+        after: Optional[Dict[str, Any]],
+    ) -> None:
+        """
+        Record a listing transition. Pass `before=None` for a create and
+        `after=None` for a delete.
+        """
+        delta = _contributions(after)
+        delta.subtract(_contributions(before))
+        inc = {k: v for k, v in delta.items() if v}
+        if inc:
+            self.col.update_one({"_id": STATS_ID}, {"$inc": inc}, upsert=True)
+
+    def snapshot(self, *, days: int = 7) -> Dict[str, Any]:
+        doc = self.col.find_one({"_id": STATS_ID}) or {}
+        today = datetime.now(timezone.utc).date()
+        recent = {
+            (today - timedelta(days=i)).isoformat() for i in range(max(1, days))
+        }
+        by_day = doc.get("soldbyday") or {}
+        types = doc.get("type") or {}
+
+        return {
+            "type": types,
+            "active": sum(v.get("active", 0) for v in types.values()),
+            "sold": sum(v.get("sold", 0) for v in types.values()),
+            "price": doc.get("price") or {},
+            "soldrecent": sum(n for d, n in by_day.items() if d in recent),
+            "reconciledat": doc.get("reconciledat"),
+        }
+
+    def reconcile(self, collections: List[Collection], *, now_iso: str) -> None:
+        """
+        Rebuild the counters from scratch using a server-side $group over
+        each listing collection (hot and archive).
+        """
+        pipeline: List[Dict[str, Any]] = [
+            {
+                "$group": {
+                    "_id": {
+                        "type": "$type",
+                        "price": "$price",
+                        "day": {
+                            "$cond": [
+                                {"$gt": ["$soldat", None]},
+                                {"$substrCP": ["$soldat", 0, 10]},
+                                None,
+                            ]
+                        },
+                    },
+                    "n": {"$sum": 1},
+                }
+            }
+        ]
+        totals: Counter = Counter()
+        for col in collections:
+            for g in col.aggregate(pipeline):
+                key = g["_id"]
+                doc = {
+                    "type": key.get("type"),
+                    "price": key.get("price"),
+                    "soldat": key.get("day"),
+                }
+                for path, n in _contributions(doc).items():
+                    totals[path] += n * g["n"]
+
+        cutoff = (
+            datetime.now(timezone.utc).date() - timedelta(days=SOLD_HISTORY_DAYS)
+        ).isoformat()
+        flat = {
+            k: v
+            for k, v in totals.items()
+            if not (k.startswith("soldbyday.") and k.split(".", 1)[1] < cutoff)
+        }
+        self.col.replace_one(
+            {"_id": STATS_ID},
+            {"_id": STATS_ID, **_unflatten(flat), "reconciledat": now_iso},
+            upsert=True,
+        )
@@ -1,7 +1,7 @@
 """Seed / reset utility for the SFSU Marketplace database.
 
 Set MODE at the top to control behavior:
-  0 — Truncate ALL three collections (accounts, listings, messages)
+  0 — Truncate ALL collections (accounts, listings, messages and derived data)
   1 — Seed sample accounts + listings
 """
 
@@ -42,13 +42,21 @@ SEED_LISTINGS = [
 
 
 def truncate_all(db: Database) -> None:
-    """Mode 0: drop every document from all three collections."""
+    """Mode 0: drop every document from all collections."""
     del_listings = db.listings.delete_many({}).deleted_count
+    del_listings += db.listings_archive.delete_many({}).deleted_count
     del_accounts = db.accounts.delete_many({}).deleted_count
     del_messages = db.messages.delete_many({}).deleted_count
+    # Derived data: counters, saved searches and their notifications, and
+    # pending events that would otherwise refer to deleted documents
+    db.stats.col.delete_many({})
+    db.saved_searches.delete_many({})
+    db.notifications.delete_many({})
+    db.outbox.delete_many({})
     print(
         f"Truncated: {del_listings} listings, "
-        f"{del_accounts} accounts, {del_messages} messages"
+        f"{del_accounts} accounts, {del_messages} messages, "
+        "plus stats, saved searches, notifications and outbox"
     )
 
 
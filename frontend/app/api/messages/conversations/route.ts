@@ -1,5 +1,5 @@
 import { NextRequest, NextResponse } from "next/server";
-import { BACKEND_URL } from "@/lib/backend";
+import { BACKEND_URL, clientHeaders } from "@/lib/backend";
 
 export async function GET(request: NextRequest) {
   const userid = request.nextUrl.searchParams.get("userid");
@@ -13,6 +13,7 @@ export async function GET(request: NextRequest) {
   try {
     const res = await fetch(
       `${BACKEND_URL}/messages/conversations/${userid}`,
+      { headers: clientHeaders(request) },
     );
     if (!res.ok) return NextResponse.json([], { status: res.status });
     return NextResponse.json(await res.json());
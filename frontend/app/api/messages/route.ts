@@ -1,5 +1,5 @@
 import { NextRequest, NextResponse } from "next/server";
-import { BACKEND_URL } from "@/lib/backend";
+import { BACKEND_URL, clientHeaders } from "@/lib/backend";
 
 export async function GET(request: NextRequest) {
   const { searchParams } = request.nextUrl;
@@ -11,7 +11,9 @@ export async function GET(request: NextRequest) {
   if (listingid) params.set("listingid", listingid);
 
   try {
-    const res = await fetch(`${BACKEND_URL}/messages?${params}`);
+    const res = await fetch(`${BACKEND_URL}/messages?${params}`, {
+      headers: clientHeaders(request),
+    });
     if (!res.ok) return NextResponse.json([], { status: res.status });
     return NextResponse.json(await res.json());
   } catch {
@@ -24,7 +26,10 @@ export async function POST(request: NextRequest) {
     const body = await request.json();
     const res = await fetch(`${BACKEND_URL}/messages`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers: {
+        "Content-Type": "application/json",
+        ...clientHeaders(request),
+      },
       body: JSON.stringify(body),
     });
     if (!res.ok) {
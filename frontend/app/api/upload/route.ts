@@ -1,5 +1,5 @@
 import { NextRequest, NextResponse } from "next/server";
-import { BACKEND_URL } from "@/lib/backend";
+import { BACKEND_URL, clientHeaders } from "@/lib/backend";
 
 export async function POST(request: NextRequest) {
   try {
@@ -7,6 +7,7 @@ export async function POST(request: NextRequest) {
 
     const res = await fetch(`${BACKEND_URL}/upload`, {
       method: "POST",
+      headers: clientHeaders(request),
       body: formData,
     });
 
@@ -1,2 +1,29 @@
 /** Base URL for the Python backend. Server-side only (never exposed to browser). */
 export const BACKEND_URL = process.env.BACKEND_URL ?? "http://localhost:8000";
+
+/** Reverse proxies in front of Next.js that append to X-Forwarded-For. */
+const FRONT_PROXY_HOPS = Number(process.env.FRONT_PROXY_HOPS ?? 0);
+
+/**
+ * Headers that pass the browser's IP on to the backend, which rate-limits
+ * per client and only trusts X-Forwarded-For from this server.
+ *
+ * Behind FRONT_PROXY_HOPS proxies, the address the outermost one saw is
+ * that many hops from the right of X-Forwarded-For. Without a front proxy
+ * every forwarding header is client-supplied, so only the socket peer
+ * stamped by server.mjs is used; under plain `next start` / `next dev`
+ * nothing is forwarded and the backend sees this server's address.
+ */
+export function clientHeaders(request: Request): Record<string, string> {
+  let ip: string | null | undefined;
+  if (FRONT_PROXY_HOPS > 0) {
+    const chain = (request.headers.get("x-forwarded-for") ?? "")
+      .split(",")
+      .map((hop) => hop.trim())
+      .filter(Boolean);
+    ip = chain[chain.length - FRONT_PROXY_HOPS];
+  } else if (process.env.CLIENT_IP_FROM_SOCKET === "1") {
+    ip = request.headers.get("x-client-ip");
+  }
+  return ip ? { "X-Forwarded-For": ip } : {};
+}
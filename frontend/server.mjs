@@ -0,0 +1,26 @@
+// Production server: `next start` plus the client's socket address.
+//
+// Route handlers cannot see the socket peer, and `next start` keeps any
+// X-Forwarded-For the client sends, so neither can be trusted for rate
+// limiting when Next.js is exposed directly. This server overwrites
+// x-client-ip with the socket peer on every request; lib/backend.ts only
+// reads it when CLIENT_IP_FROM_SOCKET is set, i.e. under this server.
+
+import { createServer } from "node:http";
+import next from "next";
+
+const port = Number(process.env.PORT ?? 3000);
+const host = process.env.HOST ?? "0.0.0.0";
+
+process.env.CLIENT_IP_FROM_SOCKET = "1";
+
+const app = next({ dev: false, hostname: host, port });
+const handle = app.getRequestHandler();
+await app.prepare();
+
+createServer((req, res) => {
+  req.headers["x-client-ip"] = req.socket.remoteAddress ?? "";
+  handle(req, res);
+}).listen(port, host, () => {
+  console.log(`> Ready on http://${host}:${port}`);
+});